@@ -1,8 +1,11 @@
+import contextlib
+import glob
+import os
+import re
 import streamlit as st
 import pandas as pd
 import numpy as np
 import networkx as nx
-import matplotlib.pyplot as plt
 from sklearn.feature_extraction.text import TfidfVectorizer
 from anthropic import Anthropic
 import faiss
@@ -10,6 +13,7 @@ from pyvis.network import Network
 import streamlit.components.v1 as components
 
 # Initialize Claude client
+@st.cache_resource
 def init_anthropic_client():
     claude_api_key = st.secrets["CLAUDE_API_KEY"]
     if not claude_api_key:
@@ -19,29 +23,91 @@ def init_anthropic_client():
 
 client = init_anthropic_client()
 
-# Load and clean data
-def load_and_clean_data(file_path, encoding='utf-8'):
+# Matters export the app searches
+DATA_FILE = 'combined_contact_and_matters.csv'
+
+# Maximum number of similarity-search candidate rows sent to Claude per check
+MAX_PROMPT_ROWS = 20
+
+# Repetitive text columns stored as pandas categoricals
+CATEGORY_COLUMNS = ['Attorney', 'Practice Area', 'Client Name']
+
+# Columns Claude needs to identify opponents and business owners
+PROMPT_COLUMNS = ['Client Name', 'Client', 'Matter', 'Matter Description', 'Practice Area', 'Attorney']
+
+# Columns backing the exact-match hash lookups, by input field
+LOOKUP_COLUMNS = {'name': '_cn_norm', 'email': '_email_norm', 'phone': '_phone_norm'}
+
+# Phone numbers are compared on their digits only
+NON_DIGITS_RE = re.compile(r'\D+')
+
+# Read a CSV, reusing a Parquet copy made from the same file size and mtime
+def read_csv_cached(file_path, encoding='utf-8'):
+    stat = os.stat(file_path)
+    base_path = os.path.splitext(file_path)[0]
+    parquet_path = f"{base_path}.{stat.st_size}-{stat.st_mtime_ns}.parquet"
+    if os.path.exists(parquet_path):
+        try:
+            return pd.read_parquet(parquet_path)
+        except Exception:
+            pass
+
     try:
         data = pd.read_csv(file_path, encoding=encoding)
     except UnicodeDecodeError:
         data = pd.read_csv(file_path, encoding='latin-1')
+
+    # The Parquet copy is only a cache: write it atomically and ignore any failure
+    tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+    try:
+        data.to_parquet(tmp_path, compression='zstd')
+        os.replace(tmp_path, parquet_path)
+    except Exception:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        return data
+
+    # Drop copies made from earlier versions of the CSV
+    for stale_path in glob.glob(f"{glob.escape(base_path)}.*.parquet"):
+        if stale_path != parquet_path:
+            with contextlib.suppress(OSError):
+                os.remove(stale_path)
+    return data
+
+# Load and clean data
+def load_and_clean_data(file_path, encoding='utf-8'):
+    data = read_csv_cached(file_path, encoding=encoding)
     
     data.columns = data.columns.str.strip()
+
+    for column in CATEGORY_COLUMNS:
+        if column in data.columns:
+            data[column] = data[column].astype('category')
+
+    # Normalize lookup fields once so each check compares prepared strings
+    data['_cn_norm'] = data['Client Name'].str.lower().str.strip()
+    data['_email_norm'] = data['Primary Email Address'].str.lower().str.strip()
+    data['_phone_norm'] = data['Primary Phone Number'].str.replace(NON_DIGITS_RE, '', regex=True)
     return data
 
+# Cache completions so repeated checks with the same prompt skip the API call
+@st.cache_data(ttl=3600, show_spinner=False)
+def complete_prompt(prompt):
+    response = client.completions.create(
+        model="claude-2.1",
+        prompt=prompt,
+        max_tokens_to_sample=1500,
+        temperature=0.7
+    )
+    return response.completion
+
 # Call Claude for analysis
 def call_claude(messages):
     try:
         system_message = messages[0]['content']
         user_message = messages[1]['content']
-        
-        response = client.completions.create(
-            model="claude-2.1",
-            prompt=f"{system_message}\n\nHuman: {user_message}\n\nAssistant:",
-            max_tokens_to_sample=1500,
-            temperature=0.7
-        )
-        return response.completion
+
+        return complete_prompt(f"{system_message}\n\nHuman: {user_message}\n\nAssistant:")
     except Exception as e:
         st.error(f"Error calling Claude: {e}")
         return None
@@ -56,13 +122,21 @@ def create_vector_index(data):
     
     return faiss_index, tfidf
 
+# Create hash lookups from exact-match field values to row positions
+def create_lookup_index(data):
+    return {field: data.groupby(column, sort=False).indices for field, column in LOOKUP_COLUMNS.items()}
+
 # Extract conflict info from data
-def extract_conflict_info(data, client_name=None, client_email=None, client_phone=None, faiss_index=None, tfidf=None):
-    exact_match = data[
-        (data['Client Name'].str.lower() == client_name.lower() if client_name else False) |
-        (data['Primary Email Address'].str.lower() == client_email.lower() if client_email else False) |
-        (data['Primary Phone Number'] == client_phone if client_phone else False)
-    ]
+def extract_conflict_info(data, client_name=None, client_email=None, client_phone=None, faiss_index=None, tfidf=None, lookup_index=None):
+    queries = {
+        'name': client_name.lower().strip() if client_name else None,
+        'email': client_email.lower().strip() if client_email else None,
+        'phone': NON_DIGITS_RE.sub('', client_phone) if client_phone else None
+    }
+    if lookup_index is None:
+        lookup_index = create_lookup_index(data)
+    positions = {pos for field, value in queries.items() if value for pos in lookup_index[field].get(value, ())}
+    exact_match = data.iloc[sorted(positions)]
     
     if not exact_match.empty:
         client_info = exact_match.iloc[0]
@@ -81,9 +155,9 @@ def extract_conflict_info(data, client_name=None, client_email=None, client_phon
         relevant_data = data.iloc[I[0]]
         
         prior_work = relevant_data[
-            relevant_data['Client Name'].str.contains(query, case=False, na=False) |
-            relevant_data['Matter'].str.contains(query, case=False, na=False) |
-            relevant_data['Matter Description'].str.contains(query, case=False, na=False)
+            relevant_data['Client Name'].str.contains(query, case=False, regex=False, na=False) |
+            relevant_data['Matter'].str.contains(query, case=False, regex=False, na=False) |
+            relevant_data['Matter Description'].str.contains(query, case=False, regex=False, na=False)
         ]
 
         if not prior_work.empty:
@@ -99,7 +173,8 @@ def extract_conflict_info(data, client_name=None, client_email=None, client_phon
             conflict_message = "No direct conflict found with the client."
             client_details = None
 
-    analysis_data = exact_match if not exact_match.empty else relevant_data
+    analysis_data = exact_match if not exact_match.empty else relevant_data.head(MAX_PROMPT_ROWS)
+    analysis_json = analysis_data[PROMPT_COLUMNS].to_json(orient='records')
 
     messages = [
         {"role": "system", "content": "You are a legal assistant tasked with identifying potential opponents, business owners, and analyzing matter descriptions related to a client."},
@@ -108,7 +183,7 @@ def extract_conflict_info(data, client_name=None, client_email=None, client_phon
 2. Potential opponents of the client based on the context of the matter
 3. Any mentioned business owners related to the client
 
-{analysis_data.to_string()}
+{analysis_json}
 
 Provide your analysis in a structured format."""}
     ]
@@ -142,31 +217,34 @@ def create_relationship_graph(data, client_name):
 
     G.add_node(client_name, label=client_name)
 
-    for index, row in data.iterrows():
-        client = row.get('Client Name', '')
-        if client != client_name and client:
-            G.add_node(client, label=client)
-            G.add_edge(client_name, client, label="Worked together on a case")
+    names = data['Client Name']
+    mask = names.notna() & (names != '') & (names != client_name)
+    clients = names[mask].unique()
+    G.add_nodes_from((client, {'label': client}) for client in clients)
+    G.add_edges_from(((client_name, client) for client in clients), label="Worked together on a case")
 
     return G
 
-# Draw and display relationship graph
-def draw_relationship_graph(graph):
+# Render the relationship graph to HTML in memory
+@st.cache_data(max_entries=16, show_spinner=False)
+def relationship_graph_html(data, client_name):
     net = Network(height="600px", width="100%", notebook=True)
-    net.from_nx(graph)
-    net.show("relationship_graph.html")
-    
-    HtmlFile = open("relationship_graph.html", "r", encoding="utf-8")
-    components.html(HtmlFile.read(), height=600)
+    net.from_nx(create_relationship_graph(data, client_name))
+    return net.generate_html(notebook=True)
 
-# Load data and create index
-@st.cache_resource
-def load_data_and_create_index():
-    matters_data = load_and_clean_data('combined_contact_and_matters.csv')
+# Draw and display relationship graph
+def draw_relationship_graph(data, client_name):
+    components.html(relationship_graph_html(data, client_name), height=600)
+
+# Load data and create index, rebuilt whenever the data file's mtime changes
+@st.cache_resource(max_entries=1)
+def load_data_and_create_index(data_version):
+    matters_data = load_and_clean_data(DATA_FILE)
     faiss_index, tfidf = create_vector_index(matters_data)
-    return matters_data, faiss_index, tfidf
+    lookup_index = create_lookup_index(matters_data)
+    return matters_data, faiss_index, tfidf, lookup_index
 
-matters_data, faiss_index, tfidf = load_data_and_create_index()
+matters_data, faiss_index, tfidf, lookup_index = load_data_and_create_index(os.path.getmtime(DATA_FILE))
 
 # Sidebar for Data Overview
 st.sidebar.header("📊 Data Overview")
@@ -192,7 +270,8 @@ with col1:
                     client_email=client_email, 
                     client_phone=client_phone, 
                     faiss_index=faiss_index, 
-                    tfidf=tfidf
+                    tfidf=tfidf,
+                    lookup_index=lookup_index
                 )
                 
                 st.write("### Conflict Check Results:")
@@ -205,12 +284,11 @@ with col1:
                 
                 if client_details:
                     st.write("#### Client Details:")
-                    for key, value in client_details.items():
-                        st.write(f"**{key}:** {value}")
+                    st.write("\n\n".join(f"**{key}:** {value}" for key, value in client_details.items()))
                 
                 if additional_info is not None and not additional_info.empty:
                     st.write("#### Potential Opponents, Direct Opponents, and Business Owners:")
-                    st.table(additional_info)
+                    st.dataframe(additional_info, hide_index=True)
                 else:
                     st.write("No potential opponents, direct opponents, or business owners identified.")
         else:
@@ -220,8 +298,7 @@ with col2:
     if st.button("Create Relationship Graph"):
         if client_name or client_email or client_phone:
             st.write("Creating relationship graph...")
-            graph = create_relationship_graph(matters_data, client_name)
-            draw_relationship_graph(graph)
+            draw_relationship_graph(matters_data, client_name)
         else:
             st.error("Please enter at least one field (Name, Email, or Phone Number)")
 